@@ -13,7 +13,11 @@ from cv2 import aruco
 import screeninfo
 from threading import Thread
 
+from artable.cache import FrameCache, frame_key
+from artable.calibration import undistort_points
+from artable.camera import Camera
 from artable.configuration import Configuration
+from artable.detector import create_parameters
 from PIL.Image import Image as PILImage
 
 from artable.plugins.Plugin import Plugin
@@ -22,7 +26,9 @@ from artable.plugins.Plugin import Plugin
 class ARTable:
     def __init__(self, config: Configuration):
         self.config = config
-        self.vc = self.__get_camera()
+        self.camera = self.__get_camera()
+        self.vc = self.camera.vc
+        self.frame_cache = FrameCache(self.config.projector_cache_size if self.config.has_projector else 0)
         print("Calibrating table...")
         if self.config.has_projector:
             (self.table_camera_t, self.camera_table_t), (
@@ -72,32 +78,57 @@ class ARTable:
 
         If no coordinates are given, the image is instead stretched to fit the table.
         This will overwrite all currently displayed content.
+        Recently displayed images are cached, showing them again skips the transformation.
 
         :param image: PIL-Image to display.
         :param xy: top left corner in mm.
         """
         if not self.config.has_projector:
             raise AssertionError("No projector configured.")
-        self.image_size = image.size
+        table_image, self.image_corners, self.image_size = self.__render(image, xy)
+        cv2.namedWindow("window", cv2.WND_PROP_FULLSCREEN)
+        cv2.setWindowProperty("window", cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+        # cv2.moveWindow("window", screen.x - 1, screen.y - 1)
+        cv2.imshow("window", table_image)
+        cv2.waitKey(1)
+
+    def preload(self, image: PILImage, xy: (float, float) = None):
+        """
+        Transforms an image for the projector without showing it, so a later display call is fast.
+
+        :param image: PIL-Image to prepare.
+        :param xy: top left corner in mm.
+        """
+        if not self.config.has_projector:
+            raise AssertionError("No projector configured.")
+        self.__render(image, xy)
+
+    def __render(self, image, xy):
+        key = None
+        if self.frame_cache.budget > 0:
+            key = frame_key(image, xy)
+            frame = self.frame_cache.get(key)
+            if frame is not None:
+                return frame
+        image_size = image.size
         image = np.array(image)
         if xy is None:
             # stretch
-            self.image_corners = ((0, 0), self.config.table_size)
+            image_corners = ((0, 0), self.config.table_size)
             screen = cv2.resize(image,self.config.table_size)
         else:
             # move
-            self.image_corners = (xy, (xy[0] + self.image_size[0], xy[1] + self.image_size[1]))
+            image_corners = (xy, (xy[0] + image_size[0], xy[1] + image_size[1]))
             screen = np.zeros((*self.config.table_size, 3), np.uint8)
             screen[xy[0], xy[1]] = image
-        # transform & show
+        # transform
         table_image = cv2.warpPerspective(screen, np.dot(self.camera_projector_t, self.table_camera_t),
                                           self.config.projector_resolution, flags=1)
         table_image = cv2.cvtColor(table_image, cv2.COLOR_RGB2BGR)
-        cv2.namedWindow("window", cv2.WND_PROP_FULLSCREEN)
-        cv2.setWindowProperty("window", cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-        # cv2.moveWindow("window", screen.x - 1, screen.y - 1)
-        cv2.imshow("window", table_image)
-        cv2.waitKey(1)
+        frame = (table_image, image_corners, image_size)
+        if key is not None:
+            self.frame_cache.put(key, frame, table_image.nbytes)
+        return frame
 
     def add_plugin(self, plugin: Plugin):
         if self.config.has_projector:
@@ -105,6 +136,8 @@ class ARTable:
                                   self.projector_camera_t)
         else:
             plugin.set_transforms(self.table_camera_t, self.camera_table_t)
+        plugin.set_intrinsics(self.config.camera_matrix, self.config.camera_distortion)
+        plugin.set_detector_parameters(self.config.detector_parameters)
         self.plugins.add(plugin)
 
     def remove_plugin(self, plugin: Plugin):
@@ -121,8 +154,11 @@ class ARTable:
             dimensions["px"] = self.config.projector_resolution
         return dimensions.get(unit)
 
-    def __get_color_image(self):
-        res, frame = self.vc.read()
+    def __get_image(self):
+        res, frame = self.camera.read()
+        if not res:
+            # e.g. a corrupt MJPG frame
+            return None
         return np.asanyarray(frame)
 
     # find transformation for the markers with the given ids
@@ -132,8 +168,13 @@ class ARTable:
         src = np.array(src, dtype="float32")
         mat_found = False
         while not mat_found:
-            image = self.__get_color_image()
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            image = self.__get_image()
+            if image is None:
+                continue
+            if image.ndim == 2:
+                gray, image = image, cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+            else:
+                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
             corners, ids, rejected_img_points = aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
             frame_markers = aruco.drawDetectedMarkers(image, corners, ids, (0, 0, 255))
             cv2.namedWindow('Marker (Calibration)', cv2.WINDOW_AUTOSIZE)
@@ -142,6 +183,7 @@ class ARTable:
             if ids is not None:
                 np_shape = np.array(corners)
                 c = np_shape[:, 0, 0, :]
+                c = undistort_points(c, self.config.camera_matrix, self.config.camera_distortion)
                 points = c.reshape(c.shape[0], 2)
                 points = list(zip(ids, points))
                 points = sorted(filter(lambda x: (x[0] in marker_ids), points))
@@ -170,7 +212,7 @@ class ARTable:
         ]
 
         aruco_dict = aruco.Dictionary_get(self.config.marker_dict)
-        parameters = aruco.DetectorParameters_create()
+        parameters = create_parameters(self.config.detector_parameters)
 
         table_tf = self.__calculate_transformation(table_marker_ids, table_abs_marker_pos, aruco_dict, parameters)
 
@@ -209,18 +251,16 @@ class ARTable:
 
 
     def __get_camera(self):
-        vc = cv2.VideoCapture(self.config.camera_id)
-        vc.set(cv2.CAP_PROP_FRAME_WIDTH,self.config.camera_resolution[0])
-        vc.set(cv2.CAP_PROP_FRAME_HEIGHT,self.config.camera_resolution[1])
-        if vc.isOpened():
-            successful, frame = vc.read()  # try to get the first frame
+        camera = Camera(self.config)
+        if camera.isOpened():
+            successful, frame = camera.read()  # try to get the first frame
             if not successful:
                 print("Error reading video stream")
                 exit(1)
         else:
             print("Error opening video stream")
             exit(1)
-        return vc
+        return camera
 
     def __start_update_loop(self):
         t = Thread(target=self.__update, args=(asyncio.new_event_loop(),))
@@ -235,7 +275,9 @@ class ARTable:
     def __update(self, loop):
         asyncio.set_event_loop(loop)
         while not self.stopped:
-            frame = self.__get_color_image()
+            frame = self.__get_image()
+            if frame is None:
+                continue
             for plugin in self.plugins:
                 plugin.update(frame)
 
@@ -22,7 +22,11 @@ from OpenGL.GL.ARB.framebuffer_object import *
 from OpenGL.GL.EXT.framebuffer_object import *
 from OpenGL.GL.shaders import *
 
+from artable.cache import FrameCache, frame_key
+from artable.calibration import undistort_points
+from artable.camera import Camera
 from artable.configuration import Configuration
+from artable.detector import create_parameters
 
 from artable.plugins.Plugin import Plugin
 
@@ -35,8 +39,12 @@ class ARTableGL:
     def __init__(self, config: Configuration):
         self.config = config
         self.calibrated = False
-        self.vc = self.__get_camera()
+        self.camera = self.__get_camera()
+        self.vc = self.camera.vc
         self.tex, self.fbo, self.draw_context, self.display_context = self.initGraphics()
+        self.current_tex = self.tex
+        self.retired_tex = None
+        self.frame_cache = FrameCache(self.config.projector_cache_size, on_evict=self.__delete_texture)
         print("Calibrating table...")
         if self.config.has_projector:
             (self.table_camera_t, self.camera_table_t), (
@@ -123,22 +131,58 @@ class ARTableGL:
         print("image update recieved")
         if not self.config.has_projector:
             raise AssertionError("No projector configured.")
-        self.image_size = image.size
+        self.current_tex, self.image_corners, self.image_size = self.__render(image, xy)
+        self.update_display()
+        if self.retired_tex is not None and self.retired_tex != self.current_tex:
+            glDeleteTextures([self.retired_tex])
+            self.retired_tex = None
+        print("image update processed")
+
+    def preload(self, image: PILImage, xy: (float, float) = None):
+        """
+        Uploads an image to the GPU without showing it, so a later display call is fast.
+
+        :param image: PIL-Image to prepare.
+        :param xy: top left corner in mm.
+        """
+        if not self.config.has_projector:
+            raise AssertionError("No projector configured.")
+        self.__render(image, xy)
+
+    def __render(self, image, xy):
+        key = None
+        if self.frame_cache.budget > 0:
+            key = frame_key(image, xy)
+            frame = self.frame_cache.get(key)
+            if frame is not None:
+                return frame
+        image_size = image.size
         image = np.array(image)
         if xy is None:
             # stretch
-            self.image_corners = ((0, 0), self.config.table_size)
+            image_corners = ((0, 0), self.config.table_size)
             screen = cv2.resize(image,self.config.table_size)
         else:
             # move
-            self.image_corners = (xy, (xy[0] + self.image_size[0], xy[1] + self.image_size[1]))
+            image_corners = (xy, (xy[0] + image_size[0], xy[1] + image_size[1]))
             screen = np.zeros((*self.config.table_size, 3), np.uint8)
             screen[xy[0], xy[1]] = image
         screen = Image.fromarray(screen)
         img_data = screen.convert("RGBA").tobytes()
         w = glutGetWindow()
         glutSetWindow(self.draw_context)
+        # render into a texture of its own, that can be kept in the cache
+        tex_size = self.config.table_size[0] * self.config.table_size[1] * 3
+        cached = tex_size <= self.frame_cache.budget
+        target_tex = self.tex
+        if cached:
+            target_tex = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, target_tex)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, self.config.table_size[0], self.config.table_size[1], 0, GL_RGB,
+                         GL_UNSIGNED_BYTE, None)
+            glBindTexture(GL_TEXTURE_2D, 0)
         glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, target_tex, 0)
         glViewport(0, 0, self.config.table_size[0], self.config.table_size[1])
         glClearColor(0, 0, 0, 1)
         glClear(GL_COLOR_BUFFER_BIT)
@@ -172,10 +216,21 @@ class ARTableGL:
         glBindTexture(GL_TEXTURE_2D, 0)
 
         glFlush()
+        glDeleteTextures([img_tex])
+        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, self.tex, 0)
         glBindFramebuffer(GL_FRAMEBUFFER, 0)
         glutSetWindow(w)
-        self.update_display()
-        print("image update processed")
+        frame = (target_tex, image_corners, image_size)
+        if cached:
+            self.frame_cache.put(key, frame, tex_size)
+        return frame
+
+    def __delete_texture(self, frame):
+        if frame[0] == self.current_tex:
+            # still on screen, delete it once something else is displayed
+            self.retired_tex = frame[0]
+            return
+        glDeleteTextures([frame[0]])
 
     def __display_function(self):
         mat = np.identity(3)
@@ -208,7 +263,7 @@ class ARTableGL:
         glUniform1f(glGetUniformLocation(shader_program, "width"), input_size[0])
         glUniform1f(glGetUniformLocation(shader_program, "height"), input_size[1])
         glActiveTexture(GL_TEXTURE0)
-        glBindTexture(GL_TEXTURE_2D, self.tex)
+        glBindTexture(GL_TEXTURE_2D, self.current_tex)
         glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
         glUniform1i(glGetUniformLocation(shader_program, "inputImageTexture"), 0)
         glEnable(GL_TEXTURE_2D)
@@ -244,6 +299,8 @@ class ARTableGL:
                                   self.projector_camera_t)
         else:
             plugin.set_transforms(self.table_camera_t, self.camera_table_t)
+        plugin.set_intrinsics(self.config.camera_matrix, self.config.camera_distortion)
+        plugin.set_detector_parameters(self.config.detector_parameters)
         self.plugins.add(plugin)
 
     def remove_plugin(self, plugin: Plugin):
@@ -260,8 +317,11 @@ class ARTableGL:
             dimensions["px"] = self.config.projector_resolution
         return dimensions.get(unit)
 
-    def __get_color_image(self):
-        res, frame = self.vc.read()
+    def __get_image(self):
+        res, frame = self.camera.read()
+        if not res:
+            # e.g. a corrupt MJPG frame
+            return None
         return np.asanyarray(frame)
 
     # find transformation for the markers with the given ids
@@ -271,8 +331,13 @@ class ARTableGL:
         src = np.array(src, dtype="float32")
         mat_found = False
         while not mat_found:
-            image = self.__get_color_image()
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            image = self.__get_image()
+            if image is None:
+                continue
+            if image.ndim == 2:
+                gray, image = image, cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+            else:
+                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
             corners, ids, rejected_img_points = aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
             frame_markers = aruco.drawDetectedMarkers(image, corners, ids, (0, 0, 255))
             cv2.namedWindow('Marker (Calibration)', cv2.WINDOW_AUTOSIZE)
@@ -281,6 +346,7 @@ class ARTableGL:
             if ids is not None:
                 np_shape = np.array(corners)
                 c = np_shape[:, 0, 0, :]
+                c = undistort_points(c, self.config.camera_matrix, self.config.camera_distortion)
                 points = c.reshape(c.shape[0], 2)
                 points = list(zip(ids, points))
                 points = sorted(filter(lambda x: (x[0] in marker_ids), points))
@@ -309,7 +375,7 @@ class ARTableGL:
         ]
 
         aruco_dict = aruco.Dictionary_get(self.config.marker_dict)
-        parameters = aruco.DetectorParameters_create()
+        parameters = create_parameters(self.config.detector_parameters)
 
         table_tf = self.__calculate_transformation(table_marker_ids, table_abs_marker_pos, aruco_dict, parameters)
 
@@ -342,18 +408,16 @@ class ARTableGL:
         return table_tf
 
     def __get_camera(self):
-        vc = cv2.VideoCapture(self.config.camera_id)
-        vc.set(cv2.CAP_PROP_FRAME_WIDTH, self.config.camera_resolution[0])
-        vc.set(cv2.CAP_PROP_FRAME_HEIGHT, self.config.camera_resolution[1])
-        if vc.isOpened():
-            successful, frame = vc.read()  # try to get the first frame
+        camera = Camera(self.config)
+        if camera.isOpened():
+            successful, frame = camera.read()  # try to get the first frame
             if not successful:
                 print("Error reading video stream")
                 exit(1)
         else:
             print("Error opening video stream")
             exit(1)
-        return vc
+        return camera
 
     def __start_update_loop(self):
         t = Thread(target=self.__update, args=(asyncio.new_event_loop(),))
@@ -368,7 +432,9 @@ class ARTableGL:
     def __update(self, loop):
         asyncio.set_event_loop(loop)
         while not self.stopped:
-            frame = self.__get_color_image()
+            frame = self.__get_image()
+            if frame is None:
+                continue
             for plugin in self.plugins:
                 plugin.update(frame)
 
@@ -0,0 +1,75 @@
+% Copyright (c) 2022, Jonas Hansert
+% All rights reserved.
+% 
+% This source code is licensed under the BSD-style license found in the
+% LICENSE file in the root directory of this source tree. 
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+def frame_key(image, xy):
+    """
+    Identifies a displayed frame by image content and placement.
+
+    :param image: PIL-Image or array.
+    :param xy: Placement of the image as given to display.
+    :return: Hashable key.
+    """
+    image = np.ascontiguousarray(image)
+    digest = hashlib.blake2b(image.data, digest_size=16).digest()
+    return digest, image.shape, image.dtype.str, None if xy is None else tuple(xy)
+
+
+class FrameCache:
+    """Least recently used cache of rendered frames, limited by their total size in bytes."""
+
+    def __init__(self, budget, on_evict=None):
+        """
+        :param budget: Maximal total size of all entries in bytes. 0 disables the cache.
+        :param on_evict: Function called with the value of every removed entry.
+        """
+        self.budget = budget
+        self.on_evict = on_evict
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key][0]
+
+    def put(self, key, value, size):
+        """
+        Adds an entry, evicting the least recently used entries if necessary.
+
+        :return: False if the value is larger than the budget and was not added.
+        """
+        if key in self.entries:
+            self.__remove(key)
+        if size > self.budget:
+            return False
+        while self.size + size > self.budget:
+            self.__remove(next(iter(self.entries)))
+        self.entries[key] = (value, size)
+        self.size += size
+        return True
+
+    def clear(self):
+        while self.entries:
+            self.__remove(next(iter(self.entries)))
+
+    def __remove(self, key):
+        value, size = self.entries.pop(key)
+        self.size -= size
+        if self.on_evict is not None:
+            self.on_evict(value)
@@ -0,0 +1,116 @@
+% Copyright (c) 2022, Jonas Hansert
+% All rights reserved.
+% 
+% This source code is licensed under the BSD-style license found in the
+% LICENSE file in the root directory of this source tree. 
+
+import json
+import sys
+import time
+
+import numpy as np
+import cv2
+
+
+def undistort_points(points, camera_matrix, distortion):
+    """
+    Removes lens distortion from pixel coordinates.
+
+    Only the given points are transformed, which is much cheaper than undistorting whole frames.
+
+    :param points: Array of pixel coordinates with shape (..., 2).
+    :param camera_matrix: 3x3 camera intrinsics or None.
+    :param distortion: Distortion coefficients as returned by cv2.calibrateCamera.
+    :return: Undistorted points in pixel coordinates with the shape of points.
+    """
+    points = np.asarray(points, dtype="float32")
+    if camera_matrix is None or points.size == 0:
+        return points
+    undistorted = cv2.undistortPoints(points.reshape((-1, 1, 2)), camera_matrix, distortion, P=camera_matrix)
+    return undistorted.reshape(points.shape)
+
+
+def capture_calibration_images(camera_id, resolution, count=15, pattern_size=(9, 6), interval=1):
+    """
+    Collects camera frames showing a chessboard pattern.
+
+    Move the pattern around between captures, covering especially the borders of the image.
+
+    :param camera_id: Index of the camera.
+    :param resolution: (width, height) of the camera.
+    :param count: Number of frames to collect.
+    :param pattern_size: Inner corners of the chessboard per row and column.
+    :param interval: Minimal time between two captures in seconds.
+    :return: List of grayscale frames.
+    """
+    vc = cv2.VideoCapture(camera_id)
+    vc.set(cv2.CAP_PROP_FRAME_WIDTH, resolution[0])
+    vc.set(cv2.CAP_PROP_FRAME_HEIGHT, resolution[1])
+    images = []
+    last_capture = 0
+    while len(images) < count:
+        successful, frame = vc.read()
+        if not successful:
+            break
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        found, corners = cv2.findChessboardCorners(gray, pattern_size, flags=cv2.CALIB_CB_FAST_CHECK)
+        if found and time.time() - last_capture > interval:
+            images.append(gray)
+            last_capture = time.time()
+        if found:
+            cv2.drawChessboardCorners(frame, pattern_size, corners, found)
+        cv2.putText(frame, "{}/{}".format(len(images), count), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        cv2.imshow('Camera (Calibration)', frame)
+        cv2.waitKey(1)
+    vc.release()
+    cv2.destroyWindow('Camera (Calibration)')
+    return images
+
+
+def calibrate_camera(images, pattern_size=(9, 6), square_size=1.):
+    """
+    Computes camera intrinsics from frames showing a chessboard pattern.
+
+    :param images: Grayscale frames, e.g. from capture_calibration_images.
+    :param pattern_size: Inner corners of the chessboard per row and column.
+    :param square_size: Size of a chessboard square. Does not affect the intrinsics.
+    :return: camera matrix, distortion coefficients and the RMS reprojection error in pixels.
+    """
+    pattern = np.zeros((pattern_size[0] * pattern_size[1], 3), np.float32)
+    pattern[:, :2] = np.mgrid[0:pattern_size[0], 0:pattern_size[1]].T.reshape(-1, 2) * square_size
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+    object_points = []
+    image_points = []
+    for image in images:
+        found, corners = cv2.findChessboardCorners(image, pattern_size)
+        if found:
+            corners = cv2.cornerSubPix(image, corners, (11, 11), (-1, -1), criteria)
+            object_points.append(pattern)
+            image_points.append(corners)
+    if len(image_points) < 3:
+        raise ValueError("Pattern found in {} images, at least 3 are needed.".format(len(image_points)))
+    size = images[0].shape[1::-1]
+    rms, camera_matrix, distortion, _, _ = cv2.calibrateCamera(object_points, image_points, size, None, None)
+    return camera_matrix, distortion.flatten(), rms
+
+
+def save_intrinsics(filepath, camera_matrix, distortion):
+    """Writes camera intrinsics into the camera entry of a configuration file."""
+    with open(filepath) as config_file:
+        data = json.load(config_file)
+    data["camera"]["matrix"] = np.asarray(camera_matrix).tolist()
+    data["camera"]["distortion"] = np.asarray(distortion).flatten().tolist()
+    with open(filepath, "w") as config_file:
+        json.dump(data, config_file, indent=2)
+
+
+if __name__ == "__main__":
+    # usage: python -m artable.calibration table.json [columns rows]
+    config_path = sys.argv[1]
+    pattern = (int(sys.argv[2]), int(sys.argv[3])) if len(sys.argv) > 3 else (9, 6)
+    with open(config_path) as file:
+        camera = json.load(file)["camera"]
+    frames = capture_calibration_images(camera["index"], (camera["width"], camera["height"]), pattern_size=pattern)
+    matrix, coefficients, error = calibrate_camera(frames, pattern)
+    print("Reprojection error: {:.3f}px".format(error))
+    save_intrinsics(config_path, matrix, coefficients)
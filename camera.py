@@ -0,0 +1,87 @@
+% Copyright (c) 2022, Jonas Hansert
+% All rights reserved.
+% 
+% This source code is licensed under the BSD-style license found in the
+% LICENSE file in the root directory of this source tree. 
+
+import time
+
+import numpy as np
+import cv2
+
+# pixel formats delivered without conversion in grayscale mode, with the channel holding luma for packed formats
+RAW_FORMATS = {"MJPG": None, "JPEG": None, "GREY": None, "Y800": None, "YUYV": 0, "YUY2": 0, "UYVY": 1}
+
+
+class Camera:
+    """
+    Wraps a cv2.VideoCapture configured by the camera entry of a Configuration.
+
+    In grayscale mode the driver's output is not converted to BGR. Frames are returned as their luma plane instead,
+    which is taken directly from GREY, YUYV and UYVY streams and decoded from MJPG streams without color conversion.
+    Other pixel formats are converted to BGR by the driver and to grayscale afterwards.
+    """
+
+    def __init__(self, config):
+        self.grayscale = config.camera_grayscale
+        self.vc = cv2.VideoCapture(config.camera_id)
+        # the pixel format has to be negotiated before the resolution
+        if config.camera_fourcc is not None:
+            self.vc.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*config.camera_fourcc))
+        self.vc.set(cv2.CAP_PROP_FRAME_WIDTH, config.camera_resolution[0])
+        self.vc.set(cv2.CAP_PROP_FRAME_HEIGHT, config.camera_resolution[1])
+        if config.camera_fps is not None:
+            self.vc.set(cv2.CAP_PROP_FPS, config.camera_fps)
+        if config.camera_buffer_size is not None:
+            self.vc.set(cv2.CAP_PROP_BUFFERSIZE, config.camera_buffer_size)
+        self.format = self.fourcc()
+        if self.grayscale and self.format in RAW_FORMATS:
+            self.vc.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        self.grab_time = 0.
+        self.retrieve_time = 0.
+
+    def isOpened(self):
+        return self.vc.isOpened()
+
+    def fourcc(self):
+        """Returns the pixel format the driver actually delivers."""
+        code = int(self.vc.get(cv2.CAP_PROP_FOURCC))
+        return "".join([chr((code >> 8 * i) & 0xFF) for i in range(4)])
+
+    def read(self):
+        """
+        Grabs and retrieves the next frame, measuring both steps separately in grab_time and retrieve_time.
+
+        :return: success and the frame, either BGR or, in grayscale mode, single channel.
+        """
+        start = time.perf_counter()
+        successful = self.vc.grab()
+        grabbed = time.perf_counter()
+        frame = None
+        if successful:
+            successful, frame = self.vc.retrieve()
+        self.grab_time = grabbed - start
+        self.retrieve_time = time.perf_counter() - grabbed
+        if successful and self.grayscale:
+            frame = self.__luma(frame)
+            successful = frame is not None
+        return successful, frame
+
+    def release(self):
+        self.vc.release()
+
+    def __luma(self, frame):
+        if frame.ndim == 3 and frame.shape[2] == 3:
+            # BGR, for formats without raw support or backends ignoring CAP_PROP_CONVERT_RGB
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.format in ("MJPG", "JPEG"):
+            # compressed buffer, None if it is corrupt
+            return cv2.imdecode(frame, cv2.IMREAD_GRAYSCALE)
+        if frame.ndim == 3 and frame.shape[2] == 2 and RAW_FORMATS.get(self.format) is not None:
+            # packed YUV, luma is every other byte
+            return np.ascontiguousarray(frame[:, :, RAW_FORMATS[self.format]])
+        if frame.ndim == 3 and frame.shape[2] == 1:
+            return frame[:, :, 0]
+        if frame.ndim == 2 and frame.shape[0] > 1:
+            return frame
+        return None
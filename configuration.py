@@ -5,6 +5,8 @@
 % LICENSE file in the root directory of this source tree. 
 
 import json
+
+import numpy as np
 from cv2 import aruco
 
 
@@ -19,9 +21,20 @@ class Configuration:
                 self.projector_resolution = (projector["width"], projector["height"])
                 self.projector_markers = projector["marker"]
                 self.projector_id = projector["screen"]
+                self.projector_cache_size = int(projector.get("cache_size", 0) * 2 ** 20)
             table = data["table"]
             self.table_size = (table["width"], table["height"])
             self.table_markers = table["marker"]
             self.marker_dict = int(aruco.__dict__[table["marker_dict"]])
+            self.detector_parameters = data.get("detector")
             self.camera_id = data["camera"]["index"]
             self.camera_resolution = (data["camera"]["width"], data["camera"]["height"])
+            self.camera_fourcc = data["camera"].get("fourcc")
+            self.camera_fps = data["camera"].get("fps")
+            self.camera_buffer_size = data["camera"].get("buffer_size")
+            self.camera_grayscale = data["camera"].get("grayscale", False)
+            self.camera_matrix = None
+            self.camera_distortion = None
+            if "matrix" in data["camera"]:
+                self.camera_matrix = np.array(data["camera"]["matrix"], dtype=np.float64).reshape((3, 3))
+                self.camera_distortion = np.array(data["camera"].get("distortion", []), dtype=np.float64)
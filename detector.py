@@ -0,0 +1,175 @@
+% Copyright (c) 2022, Jonas Hansert
+% All rights reserved.
+% 
+% This source code is licensed under the BSD-style license found in the
+% LICENSE file in the root directory of this source tree. 
+
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import cv2
+from cv2 import aruco
+
+# Named sets of detector parameters, deviating from the OpenCV defaults.
+PROFILES = {
+    "default": {},
+    # a single adaptive threshold window, fixed lighting and markers of a known minimal size
+    "fast": {
+        "adaptiveThreshWinSizeMin": 13,
+        "adaptiveThreshWinSizeMax": 13,
+        "adaptiveThreshWinSizeStep": 10,
+        "minMarkerPerimeterRate": 0.05,
+        "perspectiveRemovePixelPerCell": 3,
+    },
+    "accurate": {
+        "adaptiveThreshWinSizeStep": 4,
+        "cornerRefinementMethod": "CORNER_REFINE_SUBPIX",
+    },
+}
+
+# Values tried by tune_parameters.
+SEARCH_SPACE = {
+    "adaptiveThreshWinSizeMin": [3, 5, 7, 9, 13, 17, 23],
+    "adaptiveThreshWinSizeMax": [7, 13, 17, 23, 33],
+    "adaptiveThreshWinSizeStep": [4, 6, 10, 20, 30],
+    "adaptiveThreshConstant": [5, 7, 10],
+    "minMarkerPerimeterRate": [0.01, 0.02, 0.03, 0.05, 0.08],
+    "polygonalApproxAccuracyRate": [0.03, 0.05, 0.08],
+    "perspectiveRemovePixelPerCell": [2, 3, 4],
+    "cornerRefinementMethod": ["CORNER_REFINE_NONE", "CORNER_REFINE_SUBPIX"],
+}
+
+
+def _resolve(value):
+    if type(value) == str:
+        return aruco.__dict__[value]
+    return value
+
+
+def create_parameters(spec=None):
+    """
+    Creates aruco detector parameters.
+
+    :param spec: None for the OpenCV defaults, the name of a profile in PROFILES, a dict of parameter values
+        (optionally based on a profile given as "profile") or ready DetectorParameters.
+    :return: DetectorParameters.
+    """
+    if spec is None:
+        spec = {}
+    elif type(spec) == str:
+        spec = {"profile": spec}
+    elif not isinstance(spec, dict):
+        return spec
+    spec = dict(spec)
+    profile = spec.pop("profile", "default")
+    if profile not in PROFILES:
+        raise ValueError("Unknown detector profile '{}'. Available: {}".format(profile, ", ".join(PROFILES)))
+    parameters = aruco.DetectorParameters_create()
+    for name, value in {**PROFILES[profile], **spec}.items():
+        setattr(parameters, name, _resolve(value))
+    return parameters
+
+
+def load_frames(path):
+    """
+    Loads recorded camera frames as grayscale images.
+
+    :param path: A directory of images or a video file.
+    :return: List of grayscale frames.
+    """
+    frames = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            image = cv2.imread(os.path.join(path, name), cv2.IMREAD_GRAYSCALE)
+            if image is not None:
+                frames.append(image)
+    else:
+        vc = cv2.VideoCapture(path)
+        successful, frame = vc.read()
+        while successful:
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+            successful, frame = vc.read()
+        vc.release()
+    return frames
+
+
+def _detect(frames, aruco_dict, parameters):
+    detections = []
+    start = time.perf_counter()
+    for frame in frames:
+        corners, ids, _ = aruco.detectMarkers(frame, aruco_dict, parameters=parameters)
+        detections.append((corners, ids))
+    duration = (time.perf_counter() - start) / max(len(frames), 1)
+    return duration, [{} if ids is None else {int(i): c.reshape(4, 2) for i, c in zip(ids.flatten(), corners)}
+                      for corners, ids in detections]
+
+
+def _compare(reference, detections):
+    total, found, errors = 0, 0, []
+    for expected, detected in zip(reference, detections):
+        total += len(expected)
+        for marker_id, corners in expected.items():
+            if marker_id in detected:
+                found += 1
+                errors.append(np.mean(np.linalg.norm(detected[marker_id] - corners, axis=1)))
+    recall = found / total if total > 0 else 1.
+    return recall, float(np.mean(errors)) if errors else 0.
+
+
+def tune_parameters(frames, marker_dict, base=None, min_recall=0.99, max_corner_error=0.5, trials=200, seed=None,
+                    search_space=SEARCH_SPACE):
+    """
+    Searches detector parameters that minimise detection time on recorded frames.
+
+    Markers found with the "accurate" profile serve as reference. Candidates have to find at least min_recall
+    of them, with a mean corner deviation of at most max_corner_error pixels.
+
+    :param frames: Grayscale frames, e.g. from load_frames.
+    :param marker_dict: The marker dictionary, either as constant of cv2.aruco or its name.
+    :param base: Parameter spec (see create_parameters) the search starts from.
+    :param min_recall: Fraction of reference markers that have to be detected.
+    :param max_corner_error: Allowed mean corner deviation from the reference in pixels.
+    :param trials: Number of random candidates to evaluate.
+    :param seed: Seed of the random search.
+    :param search_space: Dict of parameter names to candidate values.
+    :return: The best parameter spec and a dict with its time per frame, recall and corner error.
+    """
+    aruco_dict = aruco.Dictionary_get(_resolve(marker_dict))
+    _, reference = _detect(frames, aruco_dict, create_parameters("accurate"))
+    if base is None:
+        base = {}
+    elif type(base) == str:
+        base = {"profile": base}
+    rng = random.Random(seed)
+    best_spec, best_stats = None, None
+    candidates = [{}] + [{name: rng.choice(values) for name, values in search_space.items()} for _ in range(trials)]
+    for candidate in candidates:
+        spec = {**base, **candidate}
+        parameters = create_parameters(spec)
+        if parameters.adaptiveThreshWinSizeMin > parameters.adaptiveThreshWinSizeMax:
+            continue
+        duration, detections = _detect(frames, aruco_dict, parameters)
+        recall, corner_error = _compare(reference, detections)
+        if recall < min_recall or corner_error > max_corner_error:
+            continue
+        if best_stats is None or duration < best_stats["time"]:
+            best_spec = spec
+            best_stats = {"time": duration, "recall": recall, "corner_error": corner_error}
+    return best_spec, best_stats
+
+
+if __name__ == "__main__":
+    # usage: python -m artable.detector table.json frames
+    with open(sys.argv[1]) as file:
+        marker_dict = json.load(file)["table"]["marker_dict"]
+    spec, stats = tune_parameters(load_frames(sys.argv[2]), marker_dict)
+    if spec is None:
+        print("No parameters reached the targets.")
+        exit(1)
+    print("{:.2f}ms per frame, recall {:.3f}, corner error {:.2f}px".format(
+        stats["time"] * 1000, stats["recall"], stats["corner_error"]))
+    print(json.dumps({"detector": spec}, indent=2))
@@ -17,6 +17,8 @@ class Plugin(ABC):
         self.projector_camera_t = None
         self.table_projector_t = None
         self.projector_table_t = None
+        self.camera_matrix = None
+        self.camera_distortion = None
 
     def set_transforms(self, table_camera_t, camera_table_t, camera_projector_t=None, projector_camera_t=None):
         self.table_camera_t, self.camera_table_t = table_camera_t, camera_table_t
@@ -25,6 +27,13 @@ class Plugin(ABC):
             self.table_projector_t = np.dot(self.camera_projector_t, self.table_camera_t)
             self.projector_table_t = np.dot(self.camera_table_t, self.projector_camera_t)
 
+    def set_intrinsics(self, camera_matrix, camera_distortion):
+        self.camera_matrix, self.camera_distortion = camera_matrix, camera_distortion
+
+    def set_detector_parameters(self, parameters):
+        # called with the detector entry of the configuration, for plugins detecting markers
+        pass
+
     def removed(self):
         self.table_camera_t, self.camera_table_t = None, None
         self.camera_projector_t, self.projector_camera_t = None, None
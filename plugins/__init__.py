@@ -8,3 +8,7 @@ from artable.plugins.Plugin import Plugin
 from artable.plugins.aruco.ArucoPlugin import ArucoPlugin as Aruco
 from artable.plugins.aruco.ArucoListener import AreaListener as ArucoAreaListener
 from artable.plugins.aruco.ArucoListener import ListenerBase as ArucoListenerBase
+from artable.plugins.aruco.ArucoListener import AreaListenerGroup as ArucoAreaListenerGroup
+from artable.plugins.aruco.ArucoRecording import Recorder as ArucoRecorder
+from artable.plugins.aruco.ArucoRecording import Replay as ArucoReplay
+from artable.plugins.aruco.ArucoMotion import MotionGate as ArucoMotionGate
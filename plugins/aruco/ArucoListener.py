@@ -27,6 +27,7 @@ class AreaListener(ListenerBase, ABC):
         self.delta_sqr = delta ** 2
         self.last_positions = {}
         self.time_threshold = time_threshold
+        self.clock = time.time
 
     def set_ids(self, ids):
         self.ids = ids
@@ -39,6 +40,7 @@ class AreaListener(ListenerBase, ABC):
                (self.area[1] <= position[1] <= self.area[3])
 
     def update(self, marker_ids, positions):
+        now = self.clock()
         for marker_id, position in zip(marker_ids, positions):
             if marker_id in self.ids:
                 if self.__inbounds(position):
@@ -46,22 +48,23 @@ class AreaListener(ListenerBase, ABC):
                         if distance_sqr(self.last_positions[marker_id][0], position) >= self.delta_sqr:
                             # move
                             self.on_move(marker_id, self.last_positions[marker_id][0].copy(), position.copy())
-                            self.last_positions[marker_id] = (position, time.time())
+                            self.last_positions[marker_id] = (position, now)
                         else:
                             # update time
-                            self.last_positions[marker_id] = (self.last_positions[marker_id][0], time.time())
+                            self.last_positions[marker_id] = (self.last_positions[marker_id][0], now)
                     else:
                         # enter
                         self.on_enter(marker_id, position.copy())
-                        self.last_positions[marker_id] = (position, time.time())
+                        self.last_positions[marker_id] = (position, now)
                 elif marker_id in self.last_positions:
                     # leave
                     self.on_leave(marker_id, self.last_positions[marker_id][0].copy())
                     self.last_positions.pop(marker_id)
         # vanish
         remove = []
+        detected = set(marker_ids)
         for marker_id in self.last_positions:
-            if marker_id not in marker_ids and time.time() - self.last_positions[marker_id][1] > self.time_threshold:
+            if marker_id not in detected and now - self.last_positions[marker_id][1] > self.time_threshold:
                 remove.append(marker_id)
         for marker_id in remove:
             self.on_leave(marker_id, self.last_positions[marker_id][0].copy())
@@ -78,3 +81,113 @@ class AreaListener(ListenerBase, ABC):
     @abstractmethod
     def on_move(self, marker_id, last_position, position):
         pass
+
+
+class AreaListenerGroup(ListenerBase):
+    """
+    Tracks markers for several AreaListeners at once.
+
+    The state of all listeners is kept in arrays indexed by listener and marker id, so each frame is evaluated
+    with a few vectorized operations and a single timestamp. Only the callbacks of the listeners are called,
+    their own update method and last_positions are not used while they belong to a group.
+    Within a frame, enters are reported before moves and leaves.
+    """
+
+    def __init__(self, listeners=(), capacity=256):
+        self.listeners = []
+        self.clock = time.time
+        self.present = np.zeros((0, capacity), bool)
+        self.positions = np.zeros((0, capacity, 2))
+        self.seen = np.zeros((0, capacity))
+        self.config = None
+        for listener in listeners:
+            self.add_listener(listener)
+
+    @property
+    def ids(self):
+        ids = set()
+        for listener in self.listeners:
+            ids.update(listener.ids)
+        return ids
+
+    def add_listener(self, listener: AreaListener):
+        capacity = self.present.shape[1]
+        self.listeners.append(listener)
+        self.present = np.vstack((self.present, np.zeros((1, capacity), bool)))
+        self.positions = np.vstack((self.positions, np.zeros((1, capacity, 2))))
+        self.seen = np.vstack((self.seen, np.zeros((1, capacity))))
+        self.config = None
+
+    def remove_listener(self, listener: AreaListener):
+        index = self.listeners.index(listener)
+        self.listeners.pop(index)
+        self.present = np.delete(self.present, index, axis=0)
+        self.positions = np.delete(self.positions, index, axis=0)
+        self.seen = np.delete(self.seen, index, axis=0)
+        self.config = None
+
+    def __grow(self, capacity):
+        padding = capacity - self.present.shape[1]
+        self.present = np.pad(self.present, ((0, 0), (0, padding)))
+        self.positions = np.pad(self.positions, ((0, 0), (0, padding), (0, 0)))
+        self.seen = np.pad(self.seen, ((0, 0), (0, padding)))
+        self.config = None
+
+    def __configure(self):
+        # listeners may change ids and area at any time
+        config = [(tuple(sorted(listener.ids)), listener.area.tobytes(), listener.delta_sqr, listener.time_threshold)
+                  for listener in self.listeners]
+        if config == self.config:
+            return
+        largest = max([max(ids, default=-1) for ids, _, _, _ in config], default=-1)
+        if largest >= self.present.shape[1]:
+            self.__grow(2 * (largest + 1))
+        self.subscribed = np.zeros(self.present.shape, bool)
+        for row, listener in enumerate(self.listeners):
+            self.subscribed[row, np.fromiter(listener.ids, dtype=int, count=len(listener.ids))] = True
+        self.areas = np.array([listener.area for listener in self.listeners], dtype=float).reshape((-1, 4))
+        self.delta_sqr = np.array([listener.delta_sqr for listener in self.listeners], dtype=float)
+        self.time_threshold = np.array([listener.time_threshold for listener in self.listeners], dtype=float)
+        self.config = config
+
+    def update(self, marker_ids, positions):
+        now = self.clock()
+        marker_ids = np.asarray(marker_ids, dtype=int).reshape(-1)
+        positions = np.asarray(positions, dtype=float).reshape((-1, 2))
+        if len(marker_ids) > 0 and marker_ids.max() >= self.present.shape[1]:
+            self.__grow(2 * (marker_ids.max() + 1))
+        self.__configure()
+        detected = np.zeros(self.present.shape[1], bool)
+        detected[marker_ids] = True
+        current = np.zeros((self.present.shape[1], 2))
+        current[marker_ids] = positions
+
+        x, y = current[None, :, 0], current[None, :, 1]
+        inside = (self.areas[:, 0:1] <= x) & (x <= self.areas[:, 2:3]) & \
+                 (self.areas[:, 1:2] <= y) & (y <= self.areas[:, 3:4])
+        visible = self.subscribed & detected
+        inbound = visible & inside
+        enter = inbound & ~self.present
+        distance_sqr = np.sum((current - self.positions) ** 2, axis=2)
+        move = inbound & self.present & (distance_sqr >= self.delta_sqr[:, None])
+        leave = (visible & ~inside & self.present) | \
+                (self.present & ~detected & (now - self.seen > self.time_threshold[:, None]))
+
+        enters = np.nonzero(enter)
+        moves = np.nonzero(move)
+        leaves = np.nonzero(leave)
+        move_from = self.positions[moves]
+        left_from = self.positions[leaves]
+        update = enter | move
+        self.positions[update] = np.broadcast_to(current, self.positions.shape)[update]
+        self.seen[inbound] = now
+        self.present = (self.present | enter) & ~leave
+
+        entered_at = current[enters[1]]
+        for i, (row, marker_id) in enumerate(zip(*enters)):
+            self.listeners[row].on_enter(marker_id, entered_at[i])
+        moved_to = current[moves[1]]
+        for i, (row, marker_id) in enumerate(zip(*moves)):
+            self.listeners[row].on_move(marker_id, move_from[i], moved_to[i])
+        for i, (row, marker_id) in enumerate(zip(*leaves)):
+            self.listeners[row].on_leave(marker_id, left_from[i])
@@ -0,0 +1,94 @@
+% Copyright (c) 2022, Jonas Hansert
+% All rights reserved.
+% 
+% This source code is licensed under the BSD-style license found in the
+% LICENSE file in the root directory of this source tree. 
+
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Finds the parts of a camera image that changed since markers were last detected in them.
+
+    Frames are downscaled and compared tile by tile against a reference, which is only updated in tiles
+    that were reported as changed. Slow movements therefore add up until they are noticed.
+    """
+
+    def __init__(self, tile_size=64, threshold=12, scale=4, refresh_interval=0.5, clock=time.monotonic):
+        """
+        :param tile_size: Edge length of a tile in camera pixels. Should be larger than a marker.
+        :param threshold: Minimal change of a downscaled pixel's brightness to count as motion.
+        :param scale: Downscaling factor used for the comparison.
+        :param refresh_interval: Seconds after which a full detection is forced. Markers missed by a full detection
+            stay missing until the next one, so this has to be well below the time_threshold of the listeners.
+        :param clock: Function returning the current time in seconds.
+        """
+        self.tile_size = tile_size
+        self.threshold = threshold
+        self.scale = scale
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self.reference = None
+        self.changed = None
+        self.last_refresh = 0.
+
+    @property
+    def tile(self):
+        # tile size in camera pixels, as a multiple of the downscaling
+        return max(self.tile_size // self.scale, 1) * self.scale
+
+    def reset(self):
+        self.reference = None
+
+    def static(self, points):
+        """
+        :param points: Array of camera pixel coordinates with shape (n, 2).
+        :return: Boolean array, True for points in tiles that did not change in the last frame.
+        """
+        if self.changed is None:
+            return np.zeros(len(points), bool)
+        tiles = (np.asarray(points) // self.tile).astype(int)
+        rows = np.clip(tiles[:, 1], 0, self.changed.shape[0] - 1)
+        cols = np.clip(tiles[:, 0], 0, self.changed.shape[1] - 1)
+        return ~self.changed[rows, cols]
+
+    def regions(self, gray):
+        """
+        :param gray: Grayscale camera image.
+        :return: None if the whole image has to be searched, else a list of changed regions as (x, y, w, h).
+        """
+        h, w = gray.shape[:2]
+        small = cv2.resize(gray, (max(w // self.scale, 1), max(h // self.scale, 1)), interpolation=cv2.INTER_AREA)
+        step = max(self.tile_size // self.scale, 1)
+        rows = np.arange(0, small.shape[0], step)
+        cols = np.arange(0, small.shape[1], step)
+        now = self.clock()
+        if self.reference is None or self.reference.shape != small.shape:
+            self.reference = small
+            self.changed = np.ones((len(rows), len(cols)), bool)
+            self.last_refresh = now
+            return None
+        diff = cv2.absdiff(small, self.reference)
+        changed = np.maximum.reduceat(np.maximum.reduceat(diff, rows, axis=0), cols, axis=1) > self.threshold
+        self.changed = changed
+        if now - self.last_refresh >= self.refresh_interval:
+            self.reference = small
+            self.last_refresh = now
+            return None
+        if not changed.any():
+            return []
+        # markers on tile borders need the neighbouring tiles
+        changed = cv2.dilate(changed.astype(np.uint8), np.ones((3, 3), np.uint8))
+        mask = np.kron(changed, np.ones((step, step), np.uint8))[:small.shape[0], :small.shape[1]]
+        np.copyto(self.reference, small, where=mask.astype(bool))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(changed, connectivity=8)
+        tile = self.tile
+        regions = []
+        for x, y, tiles_w, tiles_h, _ in stats[1:count]:
+            x, y = x * tile, y * tile
+            regions.append((x, y, min(tiles_w * tile, w - x), min(tiles_h * tile, h - y)))
+        return regions
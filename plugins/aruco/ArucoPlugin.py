@@ -4,30 +4,50 @@
 % This source code is licensed under the BSD-style license found in the
 % LICENSE file in the root directory of this source tree. 
 
+from threading import Lock
+
 import cv2
 import numpy as np
 from cv2 import aruco
 
+from artable.calibration import undistort_points
+from artable.detector import create_parameters
 from artable.plugins.Plugin import Plugin
 from artable.plugins.aruco.ArucoListener import ListenerBase
+from artable.plugins.aruco.ArucoMotion import MotionGate
+from artable.plugins.aruco.ArucoRecording import Recorder
 
 
 class ArucoPlugin(Plugin):
-    def __init__(self, marker_dict=aruco.DICT_4X4_250):
+    def __init__(self, marker_dict=aruco.DICT_4X4_250, parameters=None, motion_gate: MotionGate = None,
+                 reduce_dictionary=False, extra_ids=()):
         super().__init__()
         self.listeners = set()
         if type(marker_dict) == str:
             marker_dict = int(aruco.__dict__[marker_dict])
-        self.aruco_dict = aruco.Dictionary_get(marker_dict)
-        self.parameters = aruco.DetectorParameters_create()
+        self.marker_dict = marker_dict
+        self.full_dict = aruco.Dictionary_get(marker_dict)
+        self.aruco_dict = self.full_dict
+        self.reduce_dictionary = reduce_dictionary
+        self.extra_ids = extra_ids
+        self.reduced_ids = None  # original id of every marker in a reduced dictionary
+        self.subscribed_ids = None
+        self.parameters = create_parameters(parameters)
+        self.explicit_parameters = parameters is not None
+        self.recorder = None
+        self.recorder_lock = Lock()
+        self.motion_gate = motion_gate
+        self.last_corners = np.zeros((0, 4, 2), np.float32)
+        self.last_ids = np.zeros(0, np.int32)
 
     def update(self, image: np.array):
-        markers = self.__get_tangible_coordinates(image)
-        marker_ids = []
-        positions = []
-        for marker in markers:
-            marker_ids.append(marker[0][0])
-            positions.append(marker[1])
+        if self.reduce_dictionary:
+            self.__update_dictionary()
+        marker_ids, positions = self.__get_tangible_coordinates(image)
+        with self.recorder_lock:
+            # recordings may be stopped from another thread
+            if self.recorder is not None:
+                self.recorder.update(marker_ids, positions)
         for listener in self.listeners:
             listener.update(marker_ids, positions)
 
@@ -39,21 +59,122 @@ class ArucoPlugin(Plugin):
         self.listeners.remove(listener)
         pass
 
-    def __get_tangible_coordinates(self, image):
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    def __get_subscribed_ids(self):
+        ids = set(self.extra_ids)
+        for listener in self.listeners:
+            if not hasattr(listener, "ids"):
+                # listens to all markers
+                return None
+            ids.update(int(marker_id) for marker_id in listener.ids)
+        return frozenset(ids)
+
+    def __update_dictionary(self):
+        ids = self.__get_subscribed_ids()
+        if ids == self.subscribed_ids:
+            return
+        self.subscribed_ids = ids
+        if ids is None:
+            self.aruco_dict, self.reduced_ids = self.full_dict, None
+        else:
+            # ids outside of the dictionary can never be detected
+            size = len(self.full_dict.bytesList)
+            self.reduced_ids = np.array(sorted(i for i in ids if 0 <= i < size), dtype=np.int32)
+            self.aruco_dict = aruco.Dictionary_get(self.marker_dict)
+            self.aruco_dict.bytesList = self.full_dict.bytesList[self.reduced_ids]
+        # markers of the previous dictionary are not valid anymore
+        self.last_corners = np.zeros((0, 4, 2), np.float32)
+        self.last_ids = np.zeros(0, np.int32)
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+
+    def set_parameters(self, parameters):
+        self.parameters = create_parameters(parameters)
+        self.explicit_parameters = True
+
+    def set_detector_parameters(self, parameters):
+        if not self.explicit_parameters:
+            self.parameters = create_parameters(parameters)
+
+    def start_recording(self, path):
+        with self.recorder_lock:
+            if self.recorder is not None:
+                self.recorder.close()
+            # the previous recording is closed first, it may be continued
+            self.recorder = Recorder(path)
+
+    def stop_recording(self):
+        with self.recorder_lock:
+            if self.recorder is not None:
+                recorder, self.recorder = self.recorder, None
+                recorder.close()
+
+    def __detect(self, gray, region=None):
+        x, y = 0, 0
+        if region is not None:
+            x, y, w, h = region
+            gray = gray[y:y + h, x:x + w]
+        if self.reduced_ids is not None and len(self.reduced_ids) == 0:
+            return np.zeros((0, 4, 2), np.float32), np.zeros(0, np.int32)
         corners, ids, rejected_img_points = aruco.detectMarkers(gray, self.aruco_dict, parameters=self.parameters)
+        if ids is None:
+            return np.zeros((0, 4, 2), np.float32), np.zeros(0, np.int32)
+        corners = np.array(corners, dtype=np.float32).reshape((-1, 4, 2)) + np.array([x, y], np.float32)
+        ids = ids.flatten()
+        if self.reduced_ids is not None:
+            ids = self.reduced_ids[ids]
+        return corners, ids
+
+    def __detect_changed(self, gray):
+        regions = None if self.motion_gate is None else self.motion_gate.regions(gray)
+        if regions is None:
+            return self.__detect(gray)
+        # keep markers outside of changed regions, search the changed regions again
+        corners, ids = [], []
+        centers = np.mean(self.last_corners, axis=1)
+        keep = np.ones(len(centers), bool)
+        for region in regions:
+            keep &= ~in_region(centers, region)
+        corners.append(self.last_corners[keep])
+        ids.append(self.last_ids[keep])
+        for i, region in enumerate(regions):
+            # search one more tile around the region, so markers centered at its border are fully visible
+            region_corners, region_ids = self.__detect(gray, pad_region(region, self.motion_gate.tile, gray.shape))
+            # markers are accepted by their center, overlapping regions may detect a marker twice
+            accept = in_region(np.mean(region_corners, axis=1), region)
+            for other in regions[:i]:
+                accept &= ~in_region(np.mean(region_corners, axis=1), other)
+            corners.append(region_corners[accept])
+            ids.append(region_ids[accept])
+        # markers not found again in a changed region are kept if their own tile did not change
+        missing = ~keep & ~np.isin(self.last_ids, np.concatenate(ids)) & self.motion_gate.static(centers)
+        corners.append(self.last_corners[missing])
+        ids.append(self.last_ids[missing])
+        return np.concatenate(corners), np.concatenate(ids)
+
+    def __get_tangible_coordinates(self, image):
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        corners, ids = self.__detect_changed(gray)
+        self.last_corners, self.last_ids = corners, ids
         # frame_markers = aruco.drawDetectedMarkers(image, corners, ids, (0,0,255))
         # cv2.namedWindow('Marker', cv2.WINDOW_AUTOSIZE)
         # cv2.imshow('Marker', frame_markers)
         # cv2.waitKey(1)
-        points = np.array([])
-        if ids is not None:
-            np_shape = np.array(corners)
-            c = np_shape[:, 0, :, :]
-            points = c.reshape(c.shape[0], c.shape[1], 2)
-            points = np.array(points)
-            points = np.mean(points, axis=1)
-            points = cv2.perspectiveTransform(points.reshape((-1, 1, 2)), self.camera_table_t)
-            points = points.reshape((-1,2))
-            points = list(zip(ids, points))
-        return points
+        if len(ids) == 0:
+            return [], []
+        points = undistort_points(corners, self.camera_matrix, self.camera_distortion)
+        points = np.mean(points, axis=1)
+        points = cv2.perspectiveTransform(points.reshape((-1, 1, 2)), self.camera_table_t)
+        points = points.reshape((-1, 2))
+        return list(ids), list(points)
+
+
+def in_region(points, region):
+    x, y, w, h = region
+    return (points[:, 0] >= x) & (points[:, 0] < x + w) & (points[:, 1] >= y) & (points[:, 1] < y + h)
+
+
+def pad_region(region, padding, shape):
+    x, y, w, h = region
+    left, top = max(x - padding, 0), max(y - padding, 0)
+    right, bottom = min(x + w + padding, shape[1]), min(y + h + padding, shape[0])
+    return left, top, right - left, bottom - top
@@ -0,0 +1,130 @@
+% Copyright (c) 2022, Jonas Hansert
+% All rights reserved.
+% 
+% This source code is licensed under the BSD-style license found in the
+% LICENSE file in the root directory of this source tree. 
+
+import os
+import time
+
+import numpy as np
+
+from artable.plugins.aruco.ArucoListener import ListenerBase
+
+# one record per detected marker, frames without markers are stored as a single record with EMPTY_FRAME as id
+RECORD_DTYPE = np.dtype([("frame", "<u8"), ("time", "<f8"), ("marker_id", "<i4"), ("x", "<f4"), ("y", "<f4")])
+EMPTY_FRAME = -1
+
+
+def load_recording(path):
+    """
+    Maps a recording into memory without reading it.
+
+    :param path: File written by a Recorder.
+    :return: Read-only structured array of RECORD_DTYPE.
+    """
+    count = os.path.getsize(path) // RECORD_DTYPE.itemsize  # ignore a partially written last record
+    if count == 0:
+        return np.zeros(0, RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+
+
+class Recorder(ListenerBase):
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        records = load_recording(path) if os.path.exists(path) else np.zeros(0, RECORD_DTYPE)
+        self.frame = int(records[-1]["frame"]) + 1 if len(records) > 0 else 0
+        count = len(records)
+        del records
+        self.file = open(path, "r+b" if os.path.exists(path) else "wb")
+        # drop a partially written last record, so appended records stay aligned
+        self.file.truncate(count * RECORD_DTYPE.itemsize)
+        self.file.seek(0, os.SEEK_END)
+
+    def update(self, marker_ids, positions):
+        records = np.zeros(max(len(marker_ids), 1), RECORD_DTYPE)
+        records["frame"] = self.frame
+        records["time"] = self.clock()
+        if len(marker_ids) > 0:
+            positions = np.asarray(positions, dtype=np.float32).reshape((-1, 2))
+            records["marker_id"] = np.asarray(marker_ids).reshape(-1)
+            records["x"] = positions[:, 0]
+            records["y"] = positions[:, 1]
+        else:
+            records["marker_id"] = EMPTY_FRAME
+        self.file.write(records.tobytes())
+        self.frame += 1
+
+    def close(self):
+        self.file.close()
+
+
+class Replay:
+    def __init__(self, path):
+        self.records = load_recording(path)
+        frames = self.records["frame"]
+        if len(frames) == 0:
+            self.starts = np.zeros(0, np.intp)
+        else:
+            self.starts = np.flatnonzero(np.r_[True, frames[1:] != frames[:-1]])
+        self.ends = np.r_[self.starts[1:], len(frames)].astype(self.starts.dtype)
+        self.time = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def duration(self):
+        if len(self.records) == 0:
+            return 0.
+        return float(self.records[-1]["time"] - self.records[0]["time"])
+
+    def frames(self):
+        """Yields (timestamp, marker_ids, positions) for every recorded frame."""
+        for start, end in zip(self.starts, self.ends):
+            records = self.records[start:end]
+            timestamp = float(records[0]["time"])
+            if records[0]["marker_id"] == EMPTY_FRAME:
+                yield timestamp, [], np.zeros((0, 2), np.float32)
+            else:
+                positions = np.stack((records["x"], records["y"]), axis=1)
+                yield timestamp, list(records["marker_id"]), positions
+
+    def replay(self, listeners, speed=1.0):
+        """
+        Feeds the recording into listeners.
+
+        Listeners with a `clock` attribute see the recorded time instead of the wall clock while replaying.
+
+        :param listeners: A listener or an iterable of listeners.
+        :param speed: Playback speed relative to real time. None replays as fast as possible.
+        :return: The number of replayed frames.
+        """
+        if isinstance(listeners, ListenerBase):
+            listeners = [listeners]
+        listeners = list(listeners)
+        clocks = [(listener, listener.clock) for listener in listeners if hasattr(listener, "clock")]
+        for listener, _ in clocks:
+            listener.clock = self.__clock
+        replayed = 0
+        start_wall = time.perf_counter()
+        start_time = None
+        try:
+            for timestamp, marker_ids, positions in self.frames():
+                if start_time is None:
+                    start_time = timestamp
+                if speed is not None:
+                    delay = (timestamp - start_time) / speed - (time.perf_counter() - start_wall)
+                    if delay > 0:
+                        time.sleep(delay)
+                self.time = timestamp
+                for listener in listeners:
+                    listener.update(marker_ids, positions)
+                replayed += 1
+        finally:
+            for listener, clock in clocks:
+                listener.clock = clock
+        return replayed
+
+    def __clock(self):
+        return self.time